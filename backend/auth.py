@@ -6,10 +6,12 @@ SECRET_KEY = "super-secret-key-change-this"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# ✅ Use pbkdf2 (stable, no 72 byte issue)
+# ✅ Use argon2id (memory-hard, no 72 byte issue like bcrypt)
+# pbkdf2_sha256 and hex_sha256 are only kept to verify older rows; they get rehashed on next signin.
 pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],
-    deprecated="auto"
+    schemes=["argon2", "pbkdf2_sha256", "hex_sha256"],
+    deprecated=["pbkdf2_sha256", "hex_sha256"],
+    argon2__type="ID",
 )
 
 def hash_password(password: str):
@@ -18,6 +20,10 @@ def hash_password(password: str):
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Return (valid, new_hash); new_hash is set when the stored hash is outdated."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -1,23 +1,36 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import os
 import re
+import shutil
 import threading
-from datetime import datetime, timedelta, timezone
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Any
 
+import anyio
+import numpy as np
+import orjson
 import torch
 from fastapi import Depends, FastAPI, File, HTTPException, Query, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt
 from pydantic import BaseModel
-from sqlalchemy import func
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 from ultralytics import YOLO
 from dotenv import load_dotenv
 
+from auth import hash_password, verify_and_update_password
 from models_db import (
     Camera,
     EmailConfig,
@@ -27,10 +40,12 @@ from models_db import (
     SmsDeliveryLog,
     User,
     Violation,
+    session_scope,
 )
 from notifications import send_smtp_email, send_twilio_sms
 from schemas import AlarmResponse, InferResponse
-from workers import InferenceWorker
+from utils import utc_now_iso
+from workers import BATCH_MAX, INFER_IMGSZ, BatchInferencer, InferenceWorker, RedisPublisher
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
@@ -44,8 +59,16 @@ MAX_METADATA_STALENESS_SEC = 1.0
 REQUIRE_WS_AUTH = True
 PPE_MODEL_PATH = "PPE_detection.pt"
 FALL_MODEL_PATH = "fall_detection.pt"
-
-app = FastAPI(title="PPE + Fall Detection API")
+WARMUP_ITERS = 3
+USE_TENSORRT = True
+ENGINE_CACHE_DIR = "engines"
+# "fp16" or "int8". INT8 needs a calibration dataset yaml of representative camera frames;
+# validate mAP against the FP16 engine before switching the fall model over.
+PPE_MODEL_PRECISION = "fp16"
+FALL_MODEL_PRECISION = "fp16"
+INT8_CALIBRATION_DATA = "calib.yaml"
+
+app = FastAPI(title="PPE + Fall Detection API", default_response_class=ORJSONResponse)
 security = HTTPBearer()
 
 app.add_middleware(
@@ -55,8 +78,10 @@ app.add_middleware(
         "http://127.0.0.1:3000",
     ],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    # Explicit lists give Starlette a static preflight response; browsers cache it for max_age.
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 
@@ -64,66 +89,181 @@ app.add_middleware(
 if not torch.cuda.is_available():
     raise RuntimeError("GPU inference is mandatory. CUDA device not available.")
 
-model_ppe = YOLO(PPE_MODEL_PATH)
-model_fall = YOLO(FALL_MODEL_PATH)
-model_ppe.to("cuda")
-model_fall.to("cuda")
-try:
-    model_ppe.model.half()
-    model_fall.model.half()
-except Exception:
-    pass
 
+def engine_cache_path(pt_path: str, batch: int, precision: str) -> str:
+    # TensorRT engines are specific to the weights, precision, max batch and GPU they were built on.
+    with open(pt_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    gpu = re.sub(r"[^A-Za-z0-9]+", "-", torch.cuda.get_device_name(0)).strip("-")
+    stem = os.path.splitext(os.path.basename(pt_path))[0]
+    return os.path.join(ENGINE_CACHE_DIR, f"{stem}-{digest}-{precision}-b{batch}-{gpu}.engine")
 
-workers: dict[str, InferenceWorker] = {}
-fall_detected_store: dict[str, dict[str, Any]] = {}
-ws_connect_count: dict[str, int] = {}
-CAMERA_MODES = {"upload", "live"}
-FALL_CLEAR_REQUIRED_FRAMES = 2
-E164_RE = re.compile(r"^\+[1-9]\d{7,14}$")
 
+def load_model(pt_path: str, precision: str = "fp16", batch: int = BATCH_MAX) -> YOLO:
+    """Load a cached TensorRT engine for ``pt_path``, building it on first use."""
+    if precision == "int8" and not os.path.exists(INT8_CALIBRATION_DATA):
+        print(f"[startup] {INT8_CALIBRATION_DATA} not found, building {pt_path} as fp16")
+        precision = "fp16"
+    if USE_TENSORRT:
+        engine_path = engine_cache_path(pt_path, batch, precision)
+        if not os.path.exists(engine_path):
+            try:
+                export_args: dict[str, Any] = {"half": True}
+                if precision == "int8":
+                    export_args = {"int8": True, "data": INT8_CALIBRATION_DATA}
+                exported = YOLO(pt_path).export(
+                    format="engine",
+                    dynamic=True,
+                    batch=batch,
+                    imgsz=INFER_IMGSZ,
+                    workspace=4,
+                    device=0,
+                    **export_args,
+                )
+                os.makedirs(ENGINE_CACHE_DIR, exist_ok=True)
+                shutil.move(exported, engine_path)
+                # The engine export goes through an intermediate ONNX file next to the weights.
+                onnx_path = os.path.splitext(pt_path)[0] + ".onnx"
+                if os.path.exists(onnx_path):
+                    os.remove(onnx_path)
+            except Exception as exc:
+                print(f"[startup] TensorRT export failed for {pt_path}: {type(exc).__name__}: {exc}")
+        if os.path.exists(engine_path):
+            return YOLO(engine_path, task="detect")
+
+    # PyTorch fallback when TensorRT is disabled or unavailable.
+    model = YOLO(pt_path)
+    model.to("cuda")
+    try:
+        model.model.half()
+    except Exception:
+        pass
+    return model
 
-def utc_now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
+model_ppe = load_model(PPE_MODEL_PATH, PPE_MODEL_PRECISION)
+# A PPE model that already predicts the fall class makes the separate fall model redundant.
+PPE_COVERS_FALL = FALL_CLASS in model_ppe.names.values()
+if PPE_COVERS_FALL:
+    print(f"[startup] {PPE_MODEL_PATH} predicts {FALL_CLASS}; running PPE model only")
+    model_fall = None
+else:
+    print("[startup] running PPE and fall models")
+    model_fall = load_model(FALL_MODEL_PATH, FALL_MODEL_PRECISION)
 
-def default_alarm_state() -> dict[str, Any]:
-    return {
-        "detected": False,
-        "timestamp": None,
-        "acknowledged": False,
-        "last_alerted": None,
-        "active": False,
-        "clear_frames": 0,
-        "incident": 0,
-    }
+
+def warmup_models() -> None:
+    # First inference pays for predictor setup, cuDNN autotune and VRAM allocation.
+    # Run it here so the first WebSocket frame sees warm kernels.
+    dummy = np.zeros((INFER_IMGSZ, INFER_IMGSZ, 3), dtype=np.uint8)
+    with torch.inference_mode():
+        for _ in range(WARMUP_ITERS):
+            model_ppe(dummy, verbose=False)
+            if model_fall is not None:
+                model_fall(dummy, verbose=False)
+    torch.cuda.synchronize()
+
+
+torch.backends.cudnn.benchmark = True
+warmup_models()
+
+# Shared across all camera workers so concurrent streams share one forward pass.
+batcher = BatchInferencer(ppe_model=model_ppe, fall_model=model_fall)
+batcher.start()
+publisher = RedisPublisher(REDIS_URL)
+publisher.start()
+
+
+workers: dict[str, InferenceWorker] = {}
+fall_detected_store: dict[str, AlarmState] = {}
+ws_connect_count: dict[str, int] = {}
+CAMERA_MODES = {"upload", "live"}
+FALL_CLEAR_REQUIRED_FRAMES = 2
+THREADPOOL_SIZE = 60
+NOTIFY_WORKERS = 8
+NOTIFY_BACKLOG = 64
+notify_pool = ThreadPoolExecutor(max_workers=NOTIFY_WORKERS, thread_name_prefix="notify")
+notify_slots = threading.BoundedSemaphore(NOTIFY_BACKLOG)
+PERSIST_QUEUE_MAX = 1000
+PERSIST_BATCH_MAX = 100
+PERSIST_BATCH_WINDOW_SEC = 0.1
+# Detections are written by a background task so the WS loop never waits on the DB.
+PersistEntry = tuple[str, list[dict[str, Any]]]
+persist_queue: asyncio.Queue[PersistEntry | None] = asyncio.Queue(maxsize=PERSIST_QUEUE_MAX)
+# Queued by the shutdown hook; the consumer writes what it holds and exits.
+PERSIST_STOP = None
+persist_task: asyncio.Task | None = None
+# Built once; rows are passed as plain dicts so no Violation instances are created.
+VIOLATION_INSERT = insert(Violation)
+# Per-camera label counts for /analytics: backfilled from the DB with one grouped
+# query on first read, then kept current by persist_detections.
+analytics_counts: dict[str, Counter[str]] = {}
+analytics_lock = threading.Lock()
+# Newest violations per camera for /violations and /history, tagged with the camera's
+# write version; reused until persist_detections or delete_camera bumps the version.
+RECENT_VIOLATIONS_MAX = 100
+recent_violations: dict[str, tuple[int, list[dict[str, str]]]] = {}
+violation_versions: Counter[str] = Counter()
+# Camera names known to exist in the DB; lets ensure_camera skip the lookup.
+known_cameras: set[str] = set()
+known_cameras_lock = threading.Lock()
+
+
+def format_hms(ts: datetime) -> str:
+    # Integer formatting is several times cheaper than strftime per row.
+    return f"{ts.hour:02d}:{ts.minute:02d}:{ts.second:02d}"
+
+
+@dataclass(slots=True)
+class AlarmState:
+    # Read and written on every WS frame; slots keep attribute access cheap.
+    detected: bool = False
+    timestamp: str | None = None
+    acknowledged: bool = False
+    last_alerted: str | None = None
+    active: bool = False
+    clear_frames: int = 0
+    incident: int = 0
+    ack_time: str | None = None
+
+
+# Read-only fallback for cameras that have no state yet.
+DEFAULT_ALARM_STATE = AlarmState()
+
+
+def get_alarm_state(cam_id: str) -> AlarmState:
+    # Not setdefault(): that would build a throwaway AlarmState on every call.
+    state = fall_detected_store.get(cam_id)
+    if state is None:
+        state = AlarmState()
+        fall_detected_store[cam_id] = state
+    return state
 
 
 def update_alarm_state(cam_id: str, fall_detected: bool, timestamp: str) -> bool:
     new_incident = False
-    state = fall_detected_store.setdefault(cam_id, default_alarm_state())
+    state = get_alarm_state(cam_id)
 
     if fall_detected:
-        state["clear_frames"] = 0
+        state.clear_frames = 0
 
         # New incident starts on a rising edge.
-        if not state.get("active", False):
-            state["active"] = True
-            state["acknowledged"] = False
-            state["detected"] = True
-            state["timestamp"] = timestamp
-            state["last_alerted"] = timestamp
-            state["incident"] = int(state.get("incident", 0)) + 1
+        if not state.active:
+            state.active = True
+            state.acknowledged = False
+            state.detected = True
+            state.timestamp = timestamp
+            state.last_alerted = timestamp
+            state.incident += 1
             new_incident = True
-        elif not state.get("acknowledged", False):
-            state["detected"] = True
+        elif not state.acknowledged:
+            state.detected = True
     else:
-        clear_frames = int(state.get("clear_frames", 0)) + 1
-        state["clear_frames"] = clear_frames
-        if clear_frames >= FALL_CLEAR_REQUIRED_FRAMES:
-            state["active"] = False
-            state["detected"] = False
-            state["acknowledged"] = False
+        state.clear_frames += 1
+        if state.clear_frames >= FALL_CLEAR_REQUIRED_FRAMES:
+            state.active = False
+            state.detected = False
+            state.acknowledged = False
     return new_incident
 
 
@@ -135,9 +275,24 @@ def get_email_config(db: Session) -> EmailConfig | None:
     return db.query(EmailConfig).order_by(EmailConfig.id.asc()).first()
 
 
-def send_fall_sms_async(cam_id: str, timestamp: str) -> None:
-    db = SessionLocal()
+def submit_notification(fn) -> None:
+    # Bounded fan-out: an incident storm queues at most NOTIFY_BACKLOG sends instead of
+    # spawning a thread (plus DB session and TLS handshake) per alert.
+    if not notify_slots.acquire(blocking=False):
+        print(f"[notify] backlog full, dropped {getattr(fn, '__qualname__', fn)}")
+        return
     try:
+        future = notify_pool.submit(fn)
+    except RuntimeError:
+        # Pool already shut down (app stopping); give the slot back and drop the send.
+        notify_slots.release()
+        print(f"[notify] pool stopped, dropped {getattr(fn, '__qualname__', fn)}")
+        return
+    future.add_done_callback(lambda _: notify_slots.release())
+
+
+def send_fall_sms_async(cam_id: str, timestamp: str) -> None:
+    with session_scope() as db:
         cfg = get_sms_config(db)
         if not cfg or not cfg.enabled:
             return
@@ -145,17 +300,14 @@ def send_fall_sms_async(cam_id: str, timestamp: str) -> None:
         receiver = (cfg.receiver_number or "").strip()
         if not sender or not receiver:
             return
-        if not E164_RE.fullmatch(sender) or not E164_RE.fullmatch(receiver):
+        if not is_e164(sender) or not is_e164(receiver):
             return
-    finally:
-        db.close()
 
     body = f"[PPE Alert] Fall detected on {cam_id} at {timestamp}. Please check immediately."
 
     def _send() -> None:
         ok, detail, data = send_twilio_sms(sender, receiver, body)
-        db2 = SessionLocal()
-        try:
+        with session_scope() as db2:
             db2.add(
                 SmsDeliveryLog(
                     camera_id=cam_id,
@@ -167,16 +319,12 @@ def send_fall_sms_async(cam_id: str, timestamp: str) -> None:
                     is_test=False,
                 )
             )
-            db2.commit()
-        finally:
-            db2.close()
 
-    threading.Thread(target=_send, daemon=True).start()
+    submit_notification(_send)
 
 
 def send_fall_email_async(cam_id: str, timestamp: str) -> None:
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         cfg = get_email_config(db)
         if not cfg or not cfg.enabled:
             return
@@ -184,8 +332,6 @@ def send_fall_email_async(cam_id: str, timestamp: str) -> None:
         receiver = (cfg.receiver_email or "").strip()
         if not sender or not receiver:
             return
-    finally:
-        db.close()
 
     subject = f"PPE Alert - Fall detected on {cam_id}"
     body = (
@@ -197,8 +343,7 @@ def send_fall_email_async(cam_id: str, timestamp: str) -> None:
 
     def _send() -> None:
         ok, detail, _ = send_smtp_email(sender, receiver, subject, body)
-        db2 = SessionLocal()
-        try:
+        with session_scope() as db2:
             db2.add(
                 EmailDeliveryLog(
                     camera_id=cam_id,
@@ -210,23 +355,8 @@ def send_fall_email_async(cam_id: str, timestamp: str) -> None:
                     is_test=False,
                 )
             )
-            db2.commit()
-        finally:
-            db2.close()
-
-    threading.Thread(target=_send, daemon=True).start()
-
-
-def hash_password(password: str) -> str:
-    import hashlib
 
-    return hashlib.sha256(password.encode()).hexdigest()
-
-
-def verify_password(password: str, hashed: str) -> bool:
-    import hashlib
-
-    return hashlib.sha256(password.encode()).hexdigest() == hashed
+    submit_notification(_send)
 
 
 def get_db():
@@ -237,39 +367,62 @@ def get_db():
         db.close()
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+@lru_cache(maxsize=1024)
+def decode_token(token: str) -> tuple[str, float] | None:
+    # Cached per raw token so repeat dashboard polls skip the HMAC verify + JSON parse.
+    # Failures return None instead of raising so they are cached too; expiry is
+    # re-checked by callers against the cached exp claim.
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return username
-    except Exception as exc:
-        raise HTTPException(status_code=401, detail="Invalid token") from exc
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except Exception:
+        return None
+    username = payload.get("sub")
+    if not username:
+        return None
+    exp = payload.get("exp")
+    return username, float(exp) if exp is not None else float("inf")
 
 
-def validate_ws_token(token: str | None) -> str | None:
+def token_username(token: str | None) -> str | None:
     if not token:
         return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
-    except Exception:
+    decoded = decode_token(token)
+    if decoded is None:
+        return None
+    username, exp = decoded
+    if exp <= time.time():
         return None
+    return username
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    username = token_username(credentials.credentials)
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return username
+
+
+def validate_ws_token(token: str | None) -> str | None:
+    return token_username(token)
 
 
 def ensure_camera(db: Session, cam_id: str) -> None:
-    cam = db.query(Camera).filter(Camera.name == cam_id).first()
-    if cam is None:
-        db.add(Camera(name=cam_id))
-        db.commit()
+    if cam_id in known_cameras:
+        return
+    with known_cameras_lock:
+        if cam_id in known_cameras:
+            return
+        if db.query(Camera.id).filter(Camera.name == cam_id).first() is None:
+            db.add(Camera(name=cam_id))
+            db.commit()
+        known_cameras.add(cam_id)
 
 
 def parse_camera_id(camera_id: str) -> tuple[str, str]:
-    if "::" not in camera_id:
+    maybe_mode, sep, raw_name = camera_id.partition("::")
+    if not sep:
         return "upload", camera_id
 
-    maybe_mode, raw_name = camera_id.split("::", 1)
     mode = maybe_mode if maybe_mode in CAMERA_MODES else "upload"
     return mode, raw_name
 
@@ -289,34 +442,123 @@ def get_worker(cam_id: str) -> InferenceWorker:
         ppe_model=model_ppe,
         fall_model=model_fall,
         fall_class=FALL_CLASS,
-        redis_url=REDIS_URL,
+        batcher=batcher,
+        publisher=publisher,
     )
     worker.start()
     workers[cam_id] = worker
     ws_connect_count.setdefault(cam_id, 0)
-    fall_detected_store.setdefault(cam_id, default_alarm_state())
+    get_alarm_state(cam_id)
     return worker
 
 
-def persist_detections(cam_id: str, dets: list[dict[str, Any]]) -> None:
-    if not dets:
+def persist_detections(batch: list[tuple[str, list[dict[str, Any]]]], db: Session) -> None:
+    now = datetime.utcnow()
+    rows = [
+        {"camera_id": cam_id, "label": det["label"], "timestamp": now, "username": None}
+        for cam_id, dets in batch
+        for det in dets
+    ]
+    if not rows:
         return
 
-    db = SessionLocal()
-    try:
-        now = datetime.utcnow()
-        for det in dets:
-            db.add(
-                Violation(
-                    camera_id=cam_id,
-                    label=det["label"],
-                    timestamp=now,
-                    username=None,
-                )
+    # Core executemany insert: no ORM instances or unit-of-work bookkeeping per row.
+    # Commit and counter update share the lock so a concurrent backfill can't double count.
+    with analytics_lock:
+        try:
+            db.execute(VIOLATION_INSERT, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        for row in rows:
+            counts = analytics_counts.get(row["camera_id"])
+            if counts is not None:
+                counts[row["label"]] += 1
+        for cam_id, dets in batch:
+            if dets:
+                violation_versions[cam_id] += 1
+
+
+def get_label_counts(db: Session, cam: str) -> Counter[str]:
+    with analytics_lock:
+        counts = analytics_counts.get(cam)
+        if counts is None:
+            rows = (
+                db.query(Violation.label, func.count(Violation.id))
+                .filter(Violation.camera_id == cam)
+                .group_by(Violation.label)
+                .all()
             )
-        db.commit()
-    finally:
-        db.close()
+            counts = Counter(dict(rows))
+            # Unknown ?cam= values are answered but not cached, so the dict stays bounded.
+            if cam not in known_cameras:
+                return counts
+            analytics_counts[cam] = counts
+        return counts.copy()
+
+
+def get_recent_violations(db: Session, cam: str, limit: int) -> list[dict[str, str]]:
+    with analytics_lock:
+        version = violation_versions[cam]
+        cached = recent_violations.get(cam)
+    if cached is None or cached[0] != version:
+        rows = (
+            db.query(Violation.label, Violation.timestamp)
+            .filter(Violation.camera_id == cam)
+            .order_by(Violation.timestamp.desc())
+            .limit(RECENT_VIOLATIONS_MAX)
+            .all()
+        )
+        cached = (version, [{"message": label, "time": format_hms(ts)} for label, ts in rows])
+        # Only registered cameras get an entry, so arbitrary ?cam= values can't grow the cache.
+        if cam in known_cameras:
+            with analytics_lock:
+                recent_violations[cam] = cached
+    return cached[1][:limit]
+
+
+def enqueue_detections(cam_id: str, dets: list[dict[str, Any]]) -> None:
+    try:
+        persist_queue.put_nowait((cam_id, dets))
+    except asyncio.QueueFull:
+        print(f"[persist] camera={cam_id} queue full, dropped {len(dets)} detections")
+
+
+async def persist_consumer() -> None:
+    # One session for the consumer's lifetime; batches are written sequentially.
+    with session_scope() as db:
+        await _persist_loop(db)
+
+
+async def _persist_loop(db: Session) -> None:
+    stopping = False
+    while not stopping:
+        entry = await persist_queue.get()
+        if entry is PERSIST_STOP:
+            return
+        batch = [entry]
+        try:
+            deadline = asyncio.get_running_loop().time() + PERSIST_BATCH_WINDOW_SEC
+            while len(batch) < PERSIST_BATCH_MAX:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(persist_queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if entry is PERSIST_STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+        finally:
+            # Also runs if the task is cancelled mid-collection, so a gathered batch is
+            # never dropped; this task stays the only writer on ``db`` until it returns.
+            try:
+                await asyncio.to_thread(persist_detections, batch, db)
+            except Exception as exc:
+                print(f"[persist] error={type(exc).__name__}: {exc}")
 
 
 class AuthSchema(BaseModel):
@@ -343,13 +585,24 @@ class EmailTestSchema(BaseModel):
     message: str | None = None
 
 
+def is_e164(number: str) -> bool:
+    # Same shape as ^\+[1-9]\d{7,14}$ using C-level str checks; ASCII digits only.
+    return (
+        9 <= len(number) <= 16
+        and number.isascii()
+        and number[0] == "+"
+        and "1" <= number[1] <= "9"
+        and number[2:].isdigit()
+    )
+
+
 def validate_sms_numbers(sender: str, receiver: str) -> None:
-    if not E164_RE.fullmatch(sender):
+    if not is_e164(sender):
         raise HTTPException(
             status_code=400,
             detail="Sender number must be E.164 format, e.g. +15551234567",
         )
-    if not E164_RE.fullmatch(receiver):
+    if not is_e164(receiver):
         raise HTTPException(
             status_code=400,
             detail="Receiver number must be E.164 format, e.g. +15557654321",
@@ -364,10 +617,52 @@ def env_email_sender() -> str:
     return os.getenv("SMTP_FROM_EMAIL", "").strip() or os.getenv("SMTP_USER", "").strip()
 
 
+@app.on_event("startup")
+def raise_threadpool_limit() -> None:
+    # Sync handlers share anyio's default 40-thread limiter; match the DB pool instead
+    # so a burst of dashboard polls doesn't queue behind it.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+
+@app.on_event("startup")
+def load_known_cameras() -> None:
+    with session_scope() as db:
+        names = {name for (name,) in db.query(Camera.name).all()}
+    with known_cameras_lock:
+        known_cameras.update(names)
+
+
+@app.on_event("startup")
+async def start_persist_consumer() -> None:
+    global persist_task
+    persist_task = asyncio.create_task(persist_consumer())
+
+
 @app.on_event("shutdown")
-def shutdown_workers() -> None:
+async def shutdown_workers() -> None:
     for worker in workers.values():
         worker.stop()
+    batcher.stop()
+    publisher.stop()
+    notify_pool.shutdown(wait=False)
+
+    # Let the consumer drain everything queued ahead of the sentinel with its own session.
+    if persist_task and not persist_task.done():
+        await persist_queue.put(PERSIST_STOP)
+        try:
+            await persist_task
+        except Exception as exc:
+            print(f"[persist] consumer failed: {type(exc).__name__}: {exc}")
+    # Anything enqueued after the sentinel (or left by a dead consumer) is written here,
+    # now that no other writer is running.
+    pending = []
+    while not persist_queue.empty():
+        entry = persist_queue.get_nowait()
+        if entry is not PERSIST_STOP:
+            pending.append(entry)
+    if pending:
+        with session_scope() as db:
+            persist_detections(pending, db)
 
 
 @app.post("/signup")
@@ -383,8 +678,15 @@ def signup(data: AuthSchema, db: Session = Depends(get_db)):
 @app.post("/signin")
 def signin(data: AuthSchema, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.username == data.username).first()
-    if not user or not verify_password(data.password, user.hashed_password):
+    if not user:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    valid, new_hash = verify_and_update_password(data.password, user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        # Upgrade legacy SHA-256 rows in place.
+        user.hashed_password = new_hash
+        db.commit()
 
     expire = datetime.utcnow() + timedelta(hours=2)
     token = jwt.encode({"sub": user.username, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
@@ -395,16 +697,13 @@ def signin(data: AuthSchema, db: Session = Depends(get_db)):
 async def upload_video(
     video: UploadFile = File(...),
     camId: str = Query(..., min_length=1),
+    db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
 ):
     # Upload endpoint now only initializes pipeline metadata state.
-    # Video bytes are intentionally not streamed back by backend.
-    _ = await video.read()
-    db = SessionLocal()
-    try:
-        ensure_camera(db, camId)
-    finally:
-        db.close()
+    # Video bytes are intentionally not streamed back by backend, so don't read them.
+    await video.close()
+    await run_in_threadpool(ensure_camera, db, camId)
 
     get_worker(camId)
     return {"status": "pipeline-ready", "camId": camId, "timestamp": utc_now_iso()}
@@ -414,9 +713,36 @@ async def upload_video(
 async def start_video_alias(
     video: UploadFile = File(...),
     camId: str = Query(..., min_length=1),
+    db: Session = Depends(get_db),
     user: str = Depends(get_current_user),
 ):
-    return await upload_video(video=video, camId=camId, user=user)
+    return await upload_video(video=video, camId=camId, db=db, user=user)
+
+
+# Validated once; stalled frames copy it and patch the timestamp. Nothing mutates the lists.
+EMPTY_INFER_PAYLOAD = InferResponse(
+    dets=[],
+    fall_detected=False,
+    timestamp="",
+    frame_width=None,
+    frame_height=None,
+).model_dump()
+# Static WS payloads are encoded once; the error frame only has its timestamp spliced in.
+WS_UNAUTHORIZED_TEXT = orjson.dumps({"error": "unauthorized", "detail": "Invalid or missing token"}).decode()
+WS_ERROR_HEAD, WS_ERROR_TAIL = (
+    orjson.dumps(
+        {
+            "dets": [],
+            "fall_detected": False,
+            "timestamp": "@TS@",
+            "frame_width": None,
+            "frame_height": None,
+            "error": "ws_processing_error",
+        }
+    )
+    .decode()
+    .split("@TS@")
+)
 
 
 @app.websocket("/ws/infer")
@@ -427,7 +753,7 @@ async def ws_infer(ws: WebSocket):
     token = ws.query_params.get("token")
     username = validate_ws_token(token)
     if REQUIRE_WS_AUTH and not username:
-        await ws.send_json({"error": "unauthorized", "detail": "Invalid or missing token"})
+        await ws.send_text(WS_UNAUTHORIZED_TEXT)
         await ws.close(code=1008)
         return
 
@@ -437,59 +763,41 @@ async def ws_infer(ws: WebSocket):
     while True:
         try:
             frame_bytes = await ws.receive_bytes()
-            seq = worker.submit(frame_bytes)
-            metadata = worker.await_result(seq, timeout=2.5)
+            # Await the worker's future on the loop instead of blocking it while other
+            # cameras' sockets wait.
+            try:
+                metadata = await asyncio.wait_for(asyncio.wrap_future(worker.submit(frame_bytes)), timeout=2.5)
+            except asyncio.TimeoutError:
+                metadata = None
             if metadata is None:
-                latest = worker.latest_metadata()
-                if latest is not None:
-                    try:
-                        ts = latest.get("timestamp")
-                        if ts:
-                            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-                            age = (datetime.now(timezone.utc) - dt).total_seconds()
-                        else:
-                            age = MAX_METADATA_STALENESS_SEC + 1
-                    except Exception:
-                        age = MAX_METADATA_STALENESS_SEC + 1
-
-                    if age <= MAX_METADATA_STALENESS_SEC:
-                        metadata = latest
-                    else:
-                        metadata = InferResponse(
-                            dets=[],
-                            fall_detected=False,
-                            timestamp=utc_now_iso(),
-                            frame_width=None,
-                            frame_height=None,
-                        ).model_dump()
+                # Dropped, undecodable or timed-out frame: the reused payload is send-only,
+                # its events were already persisted by the frame that produced it.
+                to_persist = []
+                latest, age = worker.latest_metadata_with_age()
+                if latest is not None and age <= MAX_METADATA_STALENESS_SEC:
+                    metadata = latest
                 else:
-                    metadata = InferResponse(
-                        dets=[],
-                        fall_detected=False,
-                        timestamp=utc_now_iso(),
-                        frame_width=None,
-                        frame_height=None,
-                    ).model_dump()
-
-            to_persist = metadata.get("events") or []
+                    metadata = {**EMPTY_INFER_PAYLOAD, "timestamp": utc_now_iso()}
+            else:
+                to_persist = metadata.get("events") or []
+
             if to_persist:
-                persist_detections(cam_id, to_persist)
+                enqueue_detections(cam_id, to_persist)
+            # .get(key, utc_now_iso()) would format a fresh timestamp on every frame;
+            # the worker already stamped this payload.
+            timestamp = metadata.get("timestamp") or utc_now_iso()
             new_incident = update_alarm_state(
                 cam_id=cam_id,
                 fall_detected=bool(metadata.get("fall_detected")),
-                timestamp=metadata.get("timestamp", utc_now_iso()),
+                timestamp=timestamp,
             )
             if new_incident:
-                send_fall_sms_async(
-                    cam_id=cam_id,
-                    timestamp=metadata.get("timestamp", utc_now_iso()),
-                )
-                send_fall_email_async(
-                    cam_id=cam_id,
-                    timestamp=metadata.get("timestamp", utc_now_iso()),
-                )
+                # Both read their config from the DB before handing off; keep that off the loop.
+                await run_in_threadpool(send_fall_sms_async, cam_id=cam_id, timestamp=timestamp)
+                await run_in_threadpool(send_fall_email_async, cam_id=cam_id, timestamp=timestamp)
 
-            await ws.send_json(metadata)
+            # Text frame: the frontend JSON.parse()s event.data directly.
+            await ws.send_text(orjson.dumps(metadata).decode())
         except WebSocketDisconnect:
             break
         except RuntimeError:
@@ -498,16 +806,7 @@ async def ws_infer(ws: WebSocket):
         except Exception as exc:
             print(f"[ws/infer] camera={cam_id} error={type(exc).__name__}: {exc}")
             try:
-                await ws.send_json(
-                    {
-                        "dets": [],
-                        "fall_detected": False,
-                        "timestamp": utc_now_iso(),
-                        "frame_width": None,
-                        "frame_height": None,
-                        "error": "ws_processing_error",
-                    }
-                )
+                await ws.send_text(WS_ERROR_HEAD + utc_now_iso() + WS_ERROR_TAIL)
             except Exception:
                 pass
             await asyncio.sleep(0.01)
@@ -540,10 +839,8 @@ def camera_metrics(cam: str, user: str = Depends(get_current_user)):
 
 @app.get("/camera_metrics/all")
 def camera_metrics_all(db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    cams = db.query(Camera).all()
     out = []
-    for cam in cams:
-        cam_id = cam.name
+    for (cam_id,) in db.query(Camera.name).all():
         worker = workers.get(cam_id)
         if not worker:
             out.append(
@@ -577,52 +874,24 @@ def compute_mode(user: str = Depends(get_current_user)):
 
 @app.get("/violations")
 def get_violations(cam: str, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    rows = (
-        db.query(Violation)
-        .filter(Violation.camera_id == cam)
-        .order_by(Violation.timestamp.desc())
-        .limit(50)
-        .all()
-    )
-    return {
-        "violations": [
-            {"message": row.label, "time": row.timestamp.strftime("%H:%M:%S")} for row in rows
-        ]
-    }
+    return {"violations": get_recent_violations(db, cam, 50)}
 
 
 @app.get("/history")
 def get_history(cam: str, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    rows = (
-        db.query(Violation)
-        .filter(Violation.camera_id == cam)
-        .order_by(Violation.timestamp.desc())
-        .limit(100)
-        .all()
-    )
-    return {
-        "history": [
-            {"message": row.label, "time": row.timestamp.strftime("%H:%M:%S")} for row in rows
-        ]
-    }
+    return {"history": get_recent_violations(db, cam, 100)}
 
 
 @app.get("/analytics")
 def get_analytics(cam: str, db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    total = db.query(Violation).filter(Violation.camera_id == cam).count()
-    violation_count = (
-        db.query(Violation)
-        .filter(Violation.camera_id == cam, Violation.label.like("NO-%"))
-        .count()
+    label_counts = get_label_counts(db, cam)
+    total = sum(label_counts.values())
+    # Matches SQLite's case-insensitive LIKE 'NO-%' used previously.
+    violation_count = sum(
+        count for label, count in label_counts.items() if (label or "").upper().startswith("NO-")
     )
     compliant = total - violation_count
-    most_common = (
-        db.query(Violation.label, func.count(Violation.label))
-        .filter(Violation.camera_id == cam)
-        .group_by(Violation.label)
-        .order_by(func.count(Violation.label).desc())
-        .first()
-    )
+    most_common = label_counts.most_common(1)
     percent = round((violation_count / total * 100), 2) if total else 0
 
     return {
@@ -630,35 +899,34 @@ def get_analytics(cam: str, db: Session = Depends(get_db), user: str = Depends(g
         "total_detections": total,
         "violations": violation_count,
         "compliant": compliant,
-        "most_common_label": most_common[0] if most_common else None,
+        "most_common_label": most_common[0][0] if most_common else None,
         "violation_percentage": percent,
     }
 
 
 @app.get("/alarm", response_model=AlarmResponse)
 def get_alarm(cam: str, user: str = Depends(get_current_user)):
-    data = fall_detected_store.get(cam, default_alarm_state())
+    data = fall_detected_store.get(cam) or DEFAULT_ALARM_STATE
     return AlarmResponse(
-        alarm=bool(data.get("detected", False)),
-        timestamp=data.get("timestamp"),
-        acknowledged=bool(data.get("acknowledged", False)),
-        message="Fall detected!" if data.get("detected", False) else "No fall detected",
+        alarm=data.detected,
+        timestamp=data.timestamp,
+        acknowledged=data.acknowledged,
+        message="Fall detected!" if data.detected else "No fall detected",
     )
 
 
 @app.post("/alarm/acknowledge")
 def acknowledge_alarm(cam: str, user: str = Depends(get_current_user)):
-    state = fall_detected_store.setdefault(cam, default_alarm_state())
-    state["detected"] = False
-    state["acknowledged"] = True
-    state["ack_time"] = utc_now_iso()
+    state = get_alarm_state(cam)
+    state.detected = False
+    state.acknowledged = True
+    state.ack_time = utc_now_iso()
     return {"message": "Alarm acknowledged"}
 
 
 @app.get("/notifications/sms")
 def get_sms_notification_config(user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         cfg = get_sms_config(db)
         sender = env_sms_sender()
         if not cfg:
@@ -668,8 +936,6 @@ def get_sms_notification_config(user: str = Depends(get_current_user)):
             "receiver_number": cfg.receiver_number or "",
             "enabled": bool(cfg.enabled),
         }
-    finally:
-        db.close()
 
 
 @app.post("/notifications/sms")
@@ -680,8 +946,7 @@ def save_sms_notification_config(payload: SmsConfigSchema, user: str = Depends(g
     receiver = payload.receiver_number.strip()
     validate_sms_numbers(sender, receiver)
 
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         cfg = get_sms_config(db)
         if not cfg:
             cfg = SmsConfig(
@@ -695,16 +960,12 @@ def save_sms_notification_config(payload: SmsConfigSchema, user: str = Depends(g
             cfg.sender_number = sender
             cfg.receiver_number = receiver
             cfg.enabled = payload.enabled
-        db.commit()
         return {"message": "SMS notification config saved"}
-    finally:
-        db.close()
 
 
 @app.post("/notifications/sms/test")
 def send_sms_test(payload: SmsTestSchema, user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         cfg = get_sms_config(db)
         if not cfg or not cfg.enabled:
             raise HTTPException(status_code=400, detail="SMS notifications are disabled")
@@ -713,13 +974,10 @@ def send_sms_test(payload: SmsTestSchema, user: str = Depends(get_current_user))
         if not sender or not receiver:
             raise HTTPException(status_code=400, detail="Sender/receiver number is not configured")
         validate_sms_numbers(sender, receiver)
-    finally:
-        db.close()
 
     msg = (payload.message or "").strip() or f"[PPE Alert Test] Configuration test at {utc_now_iso()}."
     ok, detail, data = send_twilio_sms(sender, receiver, msg)
-    db2 = SessionLocal()
-    try:
+    with session_scope() as db2:
         db2.add(
             SmsDeliveryLog(
                 camera_id="",
@@ -731,9 +989,6 @@ def send_sms_test(payload: SmsTestSchema, user: str = Depends(get_current_user))
                 is_test=True,
             )
         )
-        db2.commit()
-    finally:
-        db2.close()
 
     if not ok:
         raise HTTPException(status_code=500, detail=detail)
@@ -743,8 +998,7 @@ def send_sms_test(payload: SmsTestSchema, user: str = Depends(get_current_user))
 @app.get("/notifications/sms/logs")
 def get_sms_logs(limit: int = 50, user: str = Depends(get_current_user)):
     safe_limit = max(1, min(limit, 200))
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         rows = (
             db.query(SmsDeliveryLog)
             .order_by(SmsDeliveryLog.created_at.desc())
@@ -767,14 +1021,11 @@ def get_sms_logs(limit: int = 50, user: str = Depends(get_current_user)):
                 for row in rows
             ]
         }
-    finally:
-        db.close()
 
 
 @app.get("/notifications/email")
 def get_email_notification_config(user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         cfg = get_email_config(db)
         sender = env_email_sender()
         if not cfg:
@@ -784,8 +1035,6 @@ def get_email_notification_config(user: str = Depends(get_current_user)):
             "receiver_email": cfg.receiver_email or "",
             "enabled": bool(cfg.enabled),
         }
-    finally:
-        db.close()
 
 
 @app.post("/notifications/email")
@@ -799,8 +1048,7 @@ def save_email_notification_config(payload: EmailConfigSchema, user: str = Depen
     if "@" not in receiver:
         raise HTTPException(status_code=400, detail="Receiver email is invalid")
 
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         cfg = get_email_config(db)
         if not cfg:
             cfg = EmailConfig(sender_email=sender, receiver_email=receiver, enabled=payload.enabled)
@@ -810,16 +1058,12 @@ def save_email_notification_config(payload: EmailConfigSchema, user: str = Depen
             cfg.sender_email = sender
             cfg.receiver_email = receiver
             cfg.enabled = payload.enabled
-        db.commit()
         return {"message": "Email notification config saved"}
-    finally:
-        db.close()
 
 
 @app.post("/notifications/email/test")
 def send_email_test(payload: EmailTestSchema, user: str = Depends(get_current_user)):
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         cfg = get_email_config(db)
         if not cfg or not cfg.enabled:
             raise HTTPException(status_code=400, detail="Email notifications are disabled")
@@ -827,14 +1071,11 @@ def send_email_test(payload: EmailTestSchema, user: str = Depends(get_current_us
         receiver = (cfg.receiver_email or "").strip()
         if not sender or not receiver:
             raise HTTPException(status_code=400, detail="Sender/receiver email is not configured")
-    finally:
-        db.close()
 
     subject = (payload.subject or "").strip() or "PPE Alert Test Email"
     message = (payload.message or "").strip() or f"PPE alert email channel test at {utc_now_iso()}."
     ok, detail, _ = send_smtp_email(sender, receiver, subject, message)
-    db2 = SessionLocal()
-    try:
+    with session_scope() as db2:
         db2.add(
             EmailDeliveryLog(
                 camera_id="",
@@ -846,9 +1087,6 @@ def send_email_test(payload: EmailTestSchema, user: str = Depends(get_current_us
                 is_test=True,
             )
         )
-        db2.commit()
-    finally:
-        db2.close()
     if not ok:
         raise HTTPException(status_code=500, detail=detail)
     return {"message": "Test email sent"}
@@ -857,8 +1095,7 @@ def send_email_test(payload: EmailTestSchema, user: str = Depends(get_current_us
 @app.get("/notifications/email/logs")
 def get_email_logs(limit: int = 50, user: str = Depends(get_current_user)):
     safe_limit = max(1, min(limit, 200))
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         rows = (
             db.query(EmailDeliveryLog)
             .order_by(EmailDeliveryLog.created_at.desc())
@@ -881,22 +1118,19 @@ def get_email_logs(limit: int = 50, user: str = Depends(get_current_user)):
                 for row in rows
             ]
         }
-    finally:
-        db.close()
 
 
 @app.get("/cameras")
 def list_cameras(db: Session = Depends(get_db), user: str = Depends(get_current_user)):
-    cams = db.query(Camera).all()
     out = []
-    for cam in cams:
-        mode, raw_name = parse_camera_id(cam.name)
+    for (cam_id,) in db.query(Camera.name).all():
+        mode, raw_name = parse_camera_id(cam_id)
         out.append(
             {
-                "id": cam.name,
+                "id": cam_id,
                 "name": raw_name,
                 "mode": mode,
-                "streaming": cam.name in workers,
+                "streaming": cam_id in workers,
             }
         )
     return {
@@ -913,10 +1147,13 @@ def create_camera(
 ):
     safe_mode = mode if mode in CAMERA_MODES else "upload"
     camera_id = make_camera_id(name, safe_mode)
-    if db.query(Camera).filter(Camera.name == camera_id).first():
-        raise HTTPException(status_code=400, detail="Camera exists")
-    db.add(Camera(name=camera_id))
-    db.commit()
+    # Same lock as ensure_camera, so a concurrent /upload or duplicate POST can't race the insert.
+    with known_cameras_lock:
+        if camera_id in known_cameras:
+            raise HTTPException(status_code=400, detail="Camera exists")
+        db.add(Camera(name=camera_id))
+        db.commit()
+        known_cameras.add(camera_id)
     return {"message": "Camera created", "id": camera_id, "name": name.strip(), "mode": safe_mode}
 
 
@@ -930,9 +1167,15 @@ def delete_camera(name: str, db: Session = Depends(get_db), user: str = Depends(
     if worker:
         worker.stop()
 
-    db.query(Violation).filter(Violation.camera_id == name).delete()
-    db.delete(cam)
-    db.commit()
+    with analytics_lock:
+        db.query(Violation).filter(Violation.camera_id == name).delete()
+        db.delete(cam)
+        db.commit()
+        analytics_counts.pop(name, None)
+        recent_violations.pop(name, None)
+        violation_versions[name] += 1
+    with known_cameras_lock:
+        known_cameras.discard(name)
 
     fall_detected_store.pop(name, None)
     return {"message": "Camera deleted"}
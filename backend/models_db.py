@@ -1,17 +1,56 @@
 from sqlalchemy import create_engine, Column, Integer, String, DateTime
-from sqlalchemy import Boolean
+from sqlalchemy import Boolean, Index, event
 from sqlalchemy.orm import declarative_base, sessionmaker
+from contextlib import contextmanager
 from datetime import datetime
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./users.db"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    # Sized for the threadpool handlers, worker threads and background writers sharing it.
+    pool_size=20,
+    max_overflow=40,
+    # LIFO keeps the few hot connections busy and lets idle ones age out.
+    pool_use_lifo=True,
+    # A local SQLite file has no server-side timeouts, so only ping other backends.
+    pool_pre_ping=not SQLALCHEMY_DATABASE_URL.startswith("sqlite"),
+    pool_recycle=1800,
 )
 
+
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL lets the /history and /analytics readers run while the persist task writes;
+        # NORMAL only fsyncs at checkpoints, which WAL keeps crash-safe.
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        # Sort/group temporaries in RAM and reads served from the page cache via mmap.
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
+
 SessionLocal = sessionmaker(bind=engine)
 
+
+@contextmanager
+def session_scope():
+    """Session that commits on success, rolls back on error and always returns its connection."""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
 Base = declarative_base()
 
 # ================= MODELS =================
@@ -34,6 +73,11 @@ class Violation(Base):
     username = Column(String)
 
 
+# /violations and /history filter by camera and sort newest first; /analytics groups by label.
+Index("ix_violations_cam_ts", Violation.camera_id, Violation.timestamp.desc())
+Index("ix_violations_cam_label", Violation.camera_id, Violation.label)
+
+
 class Camera(Base):
     __tablename__ = "cameras"
 
@@ -101,3 +145,7 @@ class EmailDeliveryLog(Base):
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+
+# create_all skips tables that already exist, so add new indexes to older databases too.
+for _index in Violation.__table__.indexes:
+    _index.create(bind=engine, checkfirst=True)
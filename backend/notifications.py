@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
 import os
 import smtplib
+import threading
 from typing import Any
 from email.message import EmailMessage
 from urllib.error import HTTPError, URLError
@@ -58,6 +60,70 @@ def send_twilio_sms(from_number: str, to_number: str, body: str) -> tuple[bool,
         return False, f"SMS send failed: {type(exc).__name__}: {exc}", {}
 
 
+# Authenticated SMTP sessions reused across alerts; skips the TCP/STARTTLS/login handshake.
+# The lock only guards the idle list, so a slow server never blocks other notify threads.
+SMTP_IDLE_MAX = 2
+SmtpKey = tuple[str, int, str, str, bool]
+_smtp_lock = threading.Lock()
+_smtp_idle: list[tuple[SmtpKey, smtplib.SMTP]] = []
+
+
+def _smtp_key(host: str, port: int, user: str, password: str, use_tls: bool) -> SmtpKey:
+    # Hash the password so a rotated credential gets a fresh session.
+    return host, port, user, hashlib.sha256(password.encode("utf-8")).hexdigest(), use_tls
+
+
+def _quit_smtp(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+def _checkout_smtp(key: SmtpKey, password: str) -> smtplib.SMTP:
+    with _smtp_lock:
+        idle = [server for k, server in _smtp_idle if k == key]
+        server = idle[0] if idle else None
+        if server is not None:
+            _smtp_idle.remove((key, server))
+    if server is not None:
+        try:
+            if server.noop()[0] == 250:
+                return server
+        except (smtplib.SMTPException, OSError):
+            pass
+        _quit_smtp(server)
+
+    host, port, user, _, use_tls = key
+    server = smtplib.SMTP(host=host, port=port, timeout=15)
+    try:
+        server.ehlo()
+        if use_tls:
+            server.starttls()
+            server.ehlo()
+        if user and password:
+            server.login(user, password)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def _checkin_smtp(key: SmtpKey, server: smtplib.SMTP) -> None:
+    with _smtp_lock:
+        # Sessions for old settings/credentials are closed instead of kept around.
+        stale = [(k, srv) for k, srv in _smtp_idle if k != key]
+        for item in stale:
+            _smtp_idle.remove(item)
+        keep = len(_smtp_idle) < SMTP_IDLE_MAX
+        if keep:
+            _smtp_idle.append((key, server))
+    for _, srv in stale:
+        _quit_smtp(srv)
+    if not keep:
+        _quit_smtp(server)
+
+
 def send_smtp_email(
     from_email: str,
     to_email: str,
@@ -81,17 +147,18 @@ def send_smtp_email(
     msg["Subject"] = subject.strip()
     msg.set_content(body.strip())
 
+    key = _smtp_key(host, port, user, password, use_tls)
+    server = None
     try:
-        with smtplib.SMTP(host=host, port=port, timeout=15) as server:
-            server.ehlo()
-            if use_tls:
-                server.starttls()
-                server.ehlo()
-            if user and password:
-                server.login(user, password)
-            server.send_message(msg)
+        server = _checkout_smtp(key, password)
+        server.send_message(msg)
+        _checkin_smtp(key, server)
         return True, "Email sent", {}
     except smtplib.SMTPException as exc:
+        if server is not None:
+            _quit_smtp(server)
         return False, f"SMTP error: {exc}", {}
     except Exception as exc:
+        if server is not None:
+            _quit_smtp(server)
         return False, f"Email send failed: {type(exc).__name__}: {exc}", {}
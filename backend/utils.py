@@ -1,13 +1,63 @@
 from __future__ import annotations
 
+import threading
+import time
 from datetime import datetime, timezone
+from typing import NamedTuple
 
 import cv2
 import numpy as np
+import torch
+import torch.nn.functional as F
+
+try:
+    from torchvision.io import ImageReadMode
+    from torchvision.io import decode_jpeg as tv_decode_jpeg
+except Exception:
+    tv_decode_jpeg = None
+
+# nvJPEG decode straight into device memory; skips the CPU decode and the raw-pixel H2D copy.
+GPU_JPEG_AVAILABLE = tv_decode_jpeg is not None and torch.cuda.is_available()
+LETTERBOX_FILL = 114 / 255.0
+ISO_CACHE_NS = 10_000_000
+_gpu_decode_lock = threading.Lock()
+
+
+class Letterbox(NamedTuple):
+    """Maps model-input coordinates back to the source frame."""
+
+    scale: float
+    pad_x: int
+    pad_y: int
+    width: int
+    height: int
+
+    def unmap(self, xyxy: np.ndarray) -> np.ndarray:
+        """Map an (N, 4) xyxy array to integer source-frame pixels, clipped to the frame."""
+        boxes = (xyxy - (self.pad_x, self.pad_y, self.pad_x, self.pad_y)) / self.scale
+        boxes = boxes.astype(np.int64)
+        np.clip(boxes[:, 0::2], 0, self.width - 1, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, self.height - 1, out=boxes[:, 1::2])
+        return boxes
+
+
+def identity_letterbox(frame) -> Letterbox:
+    return Letterbox(1.0, 0, 0, int(frame.shape[1]), int(frame.shape[0]))
+
+
+# (monotonic 10 ms bucket, formatted string); several payloads per frame share one string.
+_iso_cache: tuple[int, str] = (-1, "")
 
 
 def utc_now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    global _iso_cache
+    bucket = time.monotonic_ns() // ISO_CACHE_NS
+    cached_bucket, cached = _iso_cache
+    if bucket == cached_bucket:
+        return cached
+    iso = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    _iso_cache = (bucket, iso)
+    return iso
 
 
 def decode_jpeg(frame_bytes: bytes):
@@ -15,13 +65,59 @@ def decode_jpeg(frame_bytes: bytes):
     return cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
 
-def as_int(value: float, minimum: int = 0, maximum: int | None = None) -> int:
-    iv = int(value)
-    if iv < minimum:
-        return minimum
-    if maximum is not None and iv > maximum:
-        return maximum
-    return iv
+def letterbox_tensor(img: torch.Tensor, imgsz: int = 640) -> tuple[torch.Tensor, Letterbox]:
+    """Resize a CHW uint8 RGB tensor into a padded 1x3xSxS float tensor in [0, 1]."""
+    _, h, w = img.shape
+    scale = min(imgsz / h, imgsz / w)
+    new_h, new_w = int(round(h * scale)), int(round(w * scale))
+    pad_y, pad_x = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+
+    x = img.unsqueeze(0).float().div_(255.0)
+    if (new_h, new_w) != (h, w):
+        x = F.interpolate(x, size=(new_h, new_w), mode="bilinear", align_corners=False)
+    out = torch.full((1, 3, imgsz, imgsz), LETTERBOX_FILL, device=img.device)
+    out[:, :, pad_y : pad_y + new_h, pad_x : pad_x + new_w] = x
+    return out, Letterbox(scale, pad_x, pad_y, int(w), int(h))
+
+
+def decode_jpeg_cuda(frame_bytes: bytes, imgsz: int = 640) -> tuple[torch.Tensor, Letterbox] | None:
+    data = torch.frombuffer(bytearray(frame_bytes), dtype=torch.uint8)
+    try:
+        with _gpu_decode_lock:
+            img = tv_decode_jpeg(data, mode=ImageReadMode.RGB, device="cuda")
+    except RuntimeError:
+        # Not a baseline JPEG nvJPEG can handle; decode on CPU and upload.
+        frame = decode_jpeg(frame_bytes)
+        if frame is None:
+            return None
+        img = upload_frame(frame)
+    return letterbox_tensor(img, imgsz)
+
+
+def upload_frame(frame: np.ndarray) -> torch.Tensor:
+    """BGR HWC uint8 frame -> RGB CHW uint8 CUDA tensor."""
+    # Staging through pinned memory makes the copy a true async DMA; the caching host
+    # allocator recycles the pinned blocks, so there is no per-frame cudaHostAlloc.
+    host = torch.from_numpy(frame).pin_memory()
+    return host.to("cuda", non_blocking=True).permute(2, 0, 1).flip(0)
+
+
+def motion_thumb(frame, size: int = 64):
+    """Small grayscale copy of a frame in [0, 1] for cheap scene-change checks."""
+    if isinstance(frame, torch.Tensor):
+        gray = frame.mean(dim=1, keepdim=True)
+        return F.interpolate(gray, size=(size, size), mode="area")
+    step = max(1, min(frame.shape[0], frame.shape[1]) // size)
+    return frame[::step, ::step].mean(axis=2, dtype=np.float32) / 255.0
+
+
+def motion_delta(prev, curr) -> float:
+    """Mean absolute difference between two thumbnails; inf if they are not comparable."""
+    if prev is None or type(prev) is not type(curr) or prev.shape != curr.shape:
+        return float("inf")
+    if isinstance(curr, torch.Tensor):
+        return float((curr - prev).abs_().mean().item())
+    return float(np.abs(curr - prev).mean())
 
 
 def normalize_label(label: str) -> str:
@@ -1,16 +1,29 @@
 from __future__ import annotations
 
-import json
 import queue
 import threading
 import time
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any
 
-from sqlalchemy.orm import Session
-
-from models_db import SessionLocal, Violation
-from utils import as_int, decode_jpeg, is_fall_label, utc_now_iso
+import numpy as np
+import orjson
+import torch
+
+from utils import (
+    GPU_JPEG_AVAILABLE,
+    Letterbox,
+    decode_jpeg,
+    decode_jpeg_cuda,
+    identity_letterbox,
+    is_fall_label,
+    letterbox_tensor,
+    motion_delta,
+    motion_thumb,
+    upload_frame,
+    utc_now_iso,
+)
 
 try:
     import redis
@@ -27,24 +40,285 @@ PERSON_CONF = 0.35
 COMPLIANT_CONF = 0.2
 EVENT_CONFIRM_FRAMES = 3
 EVENT_COOLDOWN_SEC = 3.0
+BATCH_MAX = 8
+BATCH_WAIT_SEC = 0.005
+BATCH_RESULT_TIMEOUT_SEC = 5.0
+INFER_IMGSZ = 640
+FRAME_QUEUE_SLOTS = 1
+# Same-label boxes from the two models overlapping at least this much are merged.
+DEDUP_IOU = 0.65
+# Mean abs grayscale change (0-1 scale) below which the previous detections are reused.
+MOTION_THRESHOLD = 0.01
+MOTION_MAX_SKIP = 5
+PUBLISH_QUEUE_MAX = 256
+PUBLISH_BATCH_MAX = 32
+PUBLISH_WAIT_SEC = 0.02
+REDIS_RETRY_MIN_SEC = 1.0
+REDIS_RETRY_MAX_SEC = 30.0
+
+# Ultralytics model objects are shared across camera workers and keep per-call predictor
+# state, so each model is serialized on its own lock; different models may run concurrently.
+_model_locks: dict[int, threading.Lock] = {}
+_model_locks_guard = threading.Lock()
+
+
+def model_lock(model) -> threading.Lock:
+    lock = _model_locks.get(id(model))
+    if lock is None:
+        with _model_locks_guard:
+            lock = _model_locks.setdefault(id(model), threading.Lock())
+    return lock
+
+
+# _collect_dets result for a model with no boxes above threshold.
+NO_DETS = (np.empty((0, 4), dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=object), False)
+
+
+class BatchInferencer:
+    # Coalesces frames from all camera workers into one batched forward pass per model.
+    # YOLO at batch=1 leaves most of the GPU idle; a batch of 8 costs little more.
 
+    def __init__(
+        self,
+        ppe_model,
+        fall_model,
+        ppe_conf: float = PPE_CONF,
+        fall_conf: float = FALL_CONF,
+        iou: float = YOLO_IOU,
+        max_batch: int = BATCH_MAX,
+        max_wait_sec: float = BATCH_WAIT_SEC,
+    ) -> None:
+        self.ppe_model = ppe_model
+        self.fall_model = fall_model
+        self.ppe_conf = ppe_conf
+        self.fall_conf = fall_conf
+        self.iou = iou
+        self.max_batch = max_batch
+        self.max_wait_sec = max_wait_sec
+        self._queue: queue.Queue[tuple[Any, Future]] = queue.Queue()
+        self._running = False
+        self._thread: threading.Thread | None = None
+        # PPE and fall models run side by side from two threads, so one model's CPU
+        # pre/postprocess overlaps the other's forward. Separate torch CUDA streams only
+        # help the PyTorch fallback: TensorRT engines execute on TensorRT's own stream and
+        # ignore the current torch stream, so engines get no stream (and no extra sync).
+        self._model_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="yolo")
+        self._streams = (
+            self._model_stream(ppe_model),
+            self._model_stream(fall_model),
+        )
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self._model_pool.shutdown(wait=False)
+        while True:
+            try:
+                _, fut = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            fut.set_exception(RuntimeError("batch inferencer stopped"))
+
+    def infer(self, frame) -> tuple[Any, Any]:
+        """Block until the batch containing ``frame`` is done; returns (ppe_result, fall_result)."""
+        fut: Future = Future()
+        self._queue.put((frame, fut))
+        return fut.result(timeout=BATCH_RESULT_TIMEOUT_SEC)
+
+    def _collect(self) -> list[tuple[Any, Future]]:
+        try:
+            batch = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait_sec
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _model_stream(model):
+        if model is None or not torch.cuda.is_available():
+            return None
+        if str(getattr(model, "ckpt_path", "") or "").endswith(".engine"):
+            return None
+        return torch.cuda.Stream()
+
+    def _predict(self, model, inputs, conf: float, stream):
+        with torch.inference_mode(), torch.cuda.stream(stream):
+            if stream is not None:
+                # Inputs were decoded/stacked on the default stream.
+                stream.wait_stream(torch.cuda.default_stream())
+            with model_lock(model):
+                results = model(inputs, conf=conf, iou=self.iou, verbose=False)
+            if stream is not None:
+                # Result tensors are read later from worker threads on the default stream.
+                stream.synchronize()
+        return results
+
+    def _run_loop(self) -> None:
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+            frames = [frame for frame, _ in batch]
+            # GPU-decoded frames are already letterboxed to the same square shape.
+            inputs = torch.cat(frames) if isinstance(frames[0], torch.Tensor) else frames
+            try:
+                ppe_fut = self._model_pool.submit(
+                    self._predict, self.ppe_model, inputs, self.ppe_conf, self._streams[0]
+                )
+                if self.fall_model is not None:
+                    fall_fut = self._model_pool.submit(
+                        self._predict, self.fall_model, inputs, self.fall_conf, self._streams[1]
+                    )
+                    fall_res = fall_fut.result()
+                else:
+                    fall_res = [None] * len(batch)
+                ppe_res = ppe_fut.result()
+            except Exception as exc:
+                for _, fut in batch:
+                    fut.set_exception(exc)
+                continue
+            for (_, fut), ppe_r, fall_r in zip(batch, ppe_res, fall_res):
+                fut.set_result((ppe_r, fall_r))
 
-class InferenceWorker:
-    # Ultralytics model objects are shared across camera workers.
-    # Use a global lock to avoid concurrent access corruption/empty results.
-    _infer_lock = threading.Lock()
+
+class RedisPublisher:
+    # Takes Redis publishes off the inference threads: one client for all cameras,
+    # with queued messages sent as a single non-transactional pipeline.
 
+    def __init__(
+        self,
+        redis_url: str | None,
+        max_batch: int = PUBLISH_BATCH_MAX,
+        max_wait_sec: float = PUBLISH_WAIT_SEC,
+    ) -> None:
+        self.max_batch = max_batch
+        self.max_wait_sec = max_wait_sec
+        self._queue: queue.Queue[tuple[str, dict[str, Any]]] = queue.Queue(maxsize=PUBLISH_QUEUE_MAX)
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+        # Connected lazily on the publisher thread and re-created with backoff after a failure,
+        # so Redis coming up after the backend (or restarting) doesn't disable publishing.
+        self._redis_url = redis_url
+        self._client = None
+        self._retry_at = 0.0
+        self._backoff = REDIS_RETRY_MIN_SEC
+        self._down = False
+
+    def start(self) -> None:
+        if self._running or not (redis and self._redis_url):
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+    def publish(self, channel: str, payload: dict[str, Any]) -> None:
+        """Queue a payload for ``channel``; dropped if Redis is unavailable or the queue is full."""
+        if not self._running:
+            return
+        try:
+            self._queue.put_nowait((channel, payload))
+        except queue.Full:
+            pass
+
+    def _collect(self) -> list[tuple[str, dict[str, Any]]]:
+        try:
+            items = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait_sec
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _connect(self):
+        if time.monotonic() < self._retry_at:
+            return None
+        try:
+            client = redis.Redis.from_url(self._redis_url)
+            client.ping()
+        except Exception as exc:
+            self._mark_down(exc)
+            return None
+        if self._down:
+            print("[redis] publisher reconnected")
+        self._client = client
+        self._down = False
+        self._backoff = REDIS_RETRY_MIN_SEC
+        return client
+
+    def _mark_down(self, exc: Exception) -> None:
+        # Log once per outage, not once per retry.
+        if not self._down:
+            print(f"[redis] publish unavailable, retrying with backoff: {type(exc).__name__}: {exc}")
+        self._down = True
+        self._client = None
+        self._retry_at = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, REDIS_RETRY_MAX_SEC)
+
+    def _run_loop(self) -> None:
+        while self._running:
+            items = self._collect()
+            if not items:
+                continue
+            # Payloads are live metadata; ones that arrive while Redis is down are dropped.
+            client = self._client or self._connect()
+            if client is None:
+                continue
+            try:
+                pipe = client.pipeline(transaction=False)
+                for channel, payload in items:
+                    pipe.publish(channel, orjson.dumps(payload))
+                pipe.execute()
+            except Exception as exc:
+                self._mark_down(exc)
+
+
+class InferenceWorker:
     def __init__(
         self,
         camera_id: str,
         ppe_model,
         fall_model,
         fall_class: str = "Fall-Detected",
-        redis_url: str | None = None,
+        batcher: BatchInferencer | None = None,
+        publisher: RedisPublisher | None = None,
     ) -> None:
         self.camera_id = camera_id
         self.ppe_model = ppe_model
         self.fall_model = fall_model
+        self.batcher = batcher
+        self.publisher = publisher
+        self._channel = f"camera:{camera_id}:metadata"
+        self.gpu_decode = GPU_JPEG_AVAILABLE
+        self.gpu_preprocess = torch.cuda.is_available()
         self.fall_class = fall_class
         self.ppe_conf = PPE_CONF
         self.fall_conf = FALL_CONF
@@ -53,8 +327,16 @@ class InferenceWorker:
         self.event_cooldown_sec = EVENT_COOLDOWN_SEC
         self._label_streak: dict[str, int] = {}
         self._last_event_at: dict[str, float] = {}
+        self._class_tables: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        # Thumbnail, letterbox and results of the last frame that actually went through the models.
+        self._last_thumb = None
+        self._last_letterbox: Letterbox | None = None
+        self._last_dets: list[dict[str, Any]] = []
+        self._last_fall = False
+        self._motion_skips = 0
+        self._frames_reused = 0
         self._stats_lock = threading.Lock()
-        self._started_at = time.time()
+        self._started_at = time.monotonic()
         self._frames_received = 0
         self._frames_inferred = 0
         self._queue_dropped = 0
@@ -62,21 +344,12 @@ class InferenceWorker:
         self._out_ts = deque(maxlen=600)
         self._lat_ms = deque(maxlen=400)
 
-        self._queue: queue.Queue[tuple[int, bytes]] = queue.Queue(maxsize=2)
-        self._results: dict[int, dict[str, Any]] = {}
-        self._latest: dict[str, Any] | None = None
-        self._condition = threading.Condition()
+        # Latest frame wins: a new frame evicts the pending one instead of queueing behind it.
+        self._queue: queue.Queue[tuple[Future, bytes]] = queue.Queue(maxsize=FRAME_QUEUE_SLOTS)
+        # (payload, time.monotonic() when produced), swapped as one reference.
+        self._latest: tuple[dict[str, Any], float] | None = None
         self._running = False
         self._thread: threading.Thread | None = None
-        self._seq = 0
-
-        self._redis_client = None
-        if redis and redis_url:
-            try:
-                self._redis_client = redis.Redis.from_url(redis_url, decode_responses=True)
-                self._redis_client.ping()
-            except Exception:
-                self._redis_client = None
 
     def start(self) -> None:
         if self._running:
@@ -89,83 +362,98 @@ class InferenceWorker:
         self._running = False
         if self._thread and self._thread.is_alive():
             self._thread.join(timeout=1.0)
+        # Release anyone still waiting on a queued frame.
+        while True:
+            try:
+                fut, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._skip(fut)
 
-    def submit(self, frame_bytes: bytes) -> int:
-        with self._condition:
-            self._seq += 1
-            seq = self._seq
-        now = time.time()
+    def submit(self, frame_bytes: bytes) -> Future:
+        """Queue a frame; the future resolves to its payload, or None if the frame was dropped."""
+        fut: Future = Future()
+        now = time.monotonic()
         with self._stats_lock:
             self._frames_received += 1
             self._in_ts.append(now)
 
         try:
-            self._queue.put_nowait((seq, frame_bytes))
+            self._queue.put_nowait((fut, frame_bytes))
         except queue.Full:
-            # Drop oldest frame to keep latency bounded under burst load.
+            # Drop the stale frame; its waiter gets None and re-sends the latest payload to its
+            # client without persisting that payload's events again (see ws_infer).
             try:
-                self._queue.get_nowait()
+                dropped, _ = self._queue.get_nowait()
+                self._skip(dropped)
                 with self._stats_lock:
                     self._queue_dropped += 1
             except queue.Empty:
                 pass
             try:
-                self._queue.put_nowait((seq, frame_bytes))
+                self._queue.put_nowait((fut, frame_bytes))
             except queue.Full:
                 # If still full due to a race, drop this frame as well.
+                self._skip(fut)
                 with self._stats_lock:
                     self._queue_dropped += 1
-        return seq
-
-    def await_result(self, seq: int, timeout: float = 0.75) -> dict[str, Any] | None:
-        deadline = time.time() + timeout
-        with self._condition:
-            while time.time() < deadline:
-                if seq in self._results:
-                    return self._results.pop(seq)
-                remaining = deadline - time.time()
-                if remaining <= 0:
-                    break
-                self._condition.wait(timeout=remaining)
-        return None
+        return fut
+
+    @staticmethod
+    def _skip(fut: Future) -> None:
+        if fut.set_running_or_notify_cancel():
+            fut.set_result(None)
 
     def latest_metadata(self) -> dict[str, Any] | None:
-        return self._latest
+        latest = self._latest
+        return latest[0] if latest else None
 
-    def _publish(self, payload: dict[str, Any]) -> None:
-        if not self._redis_client:
-            return
-        try:
-            channel = f"camera:{self.camera_id}:metadata"
-            self._redis_client.publish(channel, json.dumps(payload))
-        except Exception:
-            pass
+    def latest_metadata_with_age(self) -> tuple[dict[str, Any] | None, float]:
+        """Latest payload and its age in seconds, measured on the monotonic clock."""
+        latest = self._latest
+        if latest is None:
+            return None, float("inf")
+        payload, produced_at = latest
+        return payload, time.monotonic() - produced_at
 
-    def _save_rows(self, dets: list[dict[str, Any]]) -> None:
-        if not dets:
-            return
-        db: Session = SessionLocal()
-        try:
-            for det in dets:
-                db.add(Violation(camera_id=self.camera_id, label=det["label"], username=None))
-            db.commit()
-        finally:
-            db.close()
+    def _publish(self, payload: dict[str, Any]) -> None:
+        if self.publisher is not None:
+            self.publisher.publish(self._channel, payload)
+
+    def _decode(self, frame_bytes: bytes) -> tuple[Any, Letterbox] | None:
+        if self.gpu_decode:
+            return decode_jpeg_cuda(frame_bytes, INFER_IMGSZ)
+        frame = decode_jpeg(frame_bytes)
+        if frame is None:
+            return None
+        if self.gpu_preprocess:
+            return letterbox_tensor(upload_frame(frame), INFER_IMGSZ)
+        return frame, identity_letterbox(frame)
 
     def _run_loop(self) -> None:
         while self._running:
             try:
-                seq, frame_bytes = self._queue.get(timeout=0.2)
+                fut, frame_bytes = self._queue.get(timeout=0.2)
             except queue.Empty:
                 continue
+            if not fut.set_running_or_notify_cancel():
+                # The WebSocket stopped waiting for this frame; don't spend GPU time on it.
+                with self._stats_lock:
+                    self._queue_dropped += 1
+                continue
 
-            frame = decode_jpeg(frame_bytes)
-            if frame is None:
+            try:
+                decoded = self._decode(frame_bytes)
+            except Exception:
+                decoded = None
+            if decoded is None:
+                fut.set_result(None)
                 continue
+            frame, letterbox = decoded
 
             try:
                 t0 = time.perf_counter()
-                payload = self._infer(frame)
+                payload = self._infer(frame, letterbox)
                 infer_ms = (time.perf_counter() - t0) * 1000.0
             except Exception as exc:
                 infer_ms = 0.0
@@ -173,32 +461,25 @@ class InferenceWorker:
                     "dets": [],
                     "fall_detected": False,
                     "timestamp": utc_now_iso(),
-                    "frame_width": int(frame.shape[1]),
-                    "frame_height": int(frame.shape[0]),
+                    "frame_width": letterbox.width,
+                    "frame_height": letterbox.height,
                     "error": f"inference_failed:{type(exc).__name__}",
                 }
-            now = time.time()
+            now = time.monotonic()
             with self._stats_lock:
                 self._frames_inferred += 1
                 self._out_ts.append(now)
                 if infer_ms > 0:
                     self._lat_ms.append(infer_ms)
 
-            self._latest = payload
+            self._latest = (payload, now)
             self._publish(payload)
 
-            with self._condition:
-                self._results[seq] = payload
-                if len(self._results) > 8:
-                    # keep memory bounded under very bursty streams
-                    oldest = sorted(self._results.keys())[:-8]
-                    for key in oldest:
-                        self._results.pop(key, None)
-                self._condition.notify_all()
+            fut.set_result(payload)
 
     def metrics(self) -> dict[str, Any]:
         with self._stats_lock:
-            now = time.time()
+            now = time.monotonic()
             window = 10.0
             fps_in = sum(1 for t in self._in_ts if now - t <= window) / window
             fps_out = sum(1 for t in self._out_ts if now - t <= window) / window
@@ -216,99 +497,137 @@ class InferenceWorker:
                 "latency_p50_ms": round(p50, 2),
                 "latency_p95_ms": round(p95, 2),
                 "dropped_frames": int(self._queue_dropped),
+                "reused_frames": int(self._frames_reused),
                 "queue_depth": int(self._queue.qsize()),
             }
 
-    def _infer(self, frame) -> dict[str, Any]:
-        dets: list[dict[str, Any]] = []
-        events: list[dict[str, Any]] = []
-        fall_detected = False
-
-        frame_h, frame_w = frame.shape[:2]
-
-        with InferenceWorker._infer_lock:
-            ppe_res = self.ppe_model(frame, conf=self.ppe_conf, iou=self.iou, verbose=False)
-            fall_res = self.fall_model(frame, conf=self.fall_conf, iou=self.iou, verbose=False)
-
-        if ppe_res and ppe_res[0].boxes is not None:
-            for box in ppe_res[0].boxes:
-                cls_idx = int(box.cls.item())
-                label = str(ppe_res[0].names[cls_idx])
-                conf = float(box.conf.item())
-                if conf < self._label_threshold(label, self.ppe_conf):
-                    continue
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                dets.append(
-                    {
-                        "x1": as_int(x1, maximum=frame_w - 1),
-                        "y1": as_int(y1, maximum=frame_h - 1),
-                        "x2": as_int(x2, maximum=frame_w - 1),
-                        "y2": as_int(y2, maximum=frame_h - 1),
-                        "label": label,
-                        "conf": round(conf, 4),
-                    }
-                )
-                if is_fall_label(label, self.fall_class):
-                    fall_detected = True
-
-        if fall_res and fall_res[0].boxes is not None:
-            for box in fall_res[0].boxes:
-                cls_idx = int(box.cls.item())
-                label = str(fall_res[0].names[cls_idx])
-                conf = float(box.conf.item())
-                if conf < self._label_threshold(label, self.fall_conf):
-                    continue
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                dets.append(
-                    {
-                        "x1": as_int(x1, maximum=frame_w - 1),
-                        "y1": as_int(y1, maximum=frame_h - 1),
-                        "x2": as_int(x2, maximum=frame_w - 1),
-                        "y2": as_int(y2, maximum=frame_h - 1),
-                        "label": label,
-                        "conf": round(conf, 4),
-                    }
-                )
-                if is_fall_label(label, self.fall_class):
-                    fall_detected = True
-
-        # Merge overlapping duplicate boxes produced by two-model pipeline.
-        if dets:
-            deduped: list[dict[str, Any]] = []
-            for det in sorted(dets, key=lambda d: d["conf"], reverse=True):
-                if det["x2"] <= det["x1"] or det["y2"] <= det["y1"]:
-                    continue
-                keep = True
-                for kept in deduped:
-                    if det["label"] != kept["label"]:
-                        continue
-                    ix1 = max(det["x1"], kept["x1"])
-                    iy1 = max(det["y1"], kept["y1"])
-                    ix2 = min(det["x2"], kept["x2"])
-                    iy2 = min(det["y2"], kept["y2"])
-                    iw = max(0, ix2 - ix1)
-                    ih = max(0, iy2 - iy1)
-                    inter = iw * ih
-                    area_a = max(1, (det["x2"] - det["x1"]) * (det["y2"] - det["y1"]))
-                    area_b = max(1, (kept["x2"] - kept["x1"]) * (kept["y2"] - kept["y1"]))
-                    iou = inter / float(area_a + area_b - inter + 1e-6)
-                    if iou >= 0.65:
-                        keep = False
-                        break
-                if keep:
-                    deduped.append(det)
-            dets = deduped
-        events = self._extract_events(dets)
+    def _infer(self, frame, letterbox: Letterbox) -> dict[str, Any]:
+        thumb = motion_thumb(frame)
+        # Static scene: reuse the last detections, but never while a fall or any other label
+        # is partway to confirm_frames (reused frames don't advance streaks).
+        if (
+            not self._last_fall
+            and not any(0 < streak < self.confirm_frames for streak in self._label_streak.values())
+            and self._motion_skips < MOTION_MAX_SKIP
+            and letterbox == self._last_letterbox
+            and motion_delta(self._last_thumb, thumb) < MOTION_THRESHOLD
+        ):
+            self._motion_skips += 1
+            with self._stats_lock:
+                self._frames_reused += 1
+            # Reused detections are display-only: counting them toward confirm_frames would
+            # let one inferred frame confirm an event on its own.
+            dets, fall_detected, events = list(self._last_dets), False, []
+        else:
+            dets, fall_detected = self._detect(frame, letterbox)
+            self._last_thumb = thumb
+            self._last_letterbox = letterbox
+            self._last_dets = dets
+            self._last_fall = fall_detected
+            self._motion_skips = 0
+            events = self._extract_events(dets)
 
         return {
             "dets": dets,
             "events": events,
             "fall_detected": fall_detected,
             "timestamp": utc_now_iso(),
-            "frame_width": int(frame.shape[1]),
-            "frame_height": int(frame.shape[0]),
+            "frame_width": letterbox.width,
+            "frame_height": letterbox.height,
         }
 
+    def _detect(self, frame, letterbox: Letterbox) -> tuple[list[dict[str, Any]], bool]:
+        if self.batcher is not None:
+            ppe_res, fall_res = self.batcher.infer(frame)
+        else:
+            with torch.inference_mode():
+                with model_lock(self.ppe_model):
+                    ppe_res = self.ppe_model(frame, conf=self.ppe_conf, iou=self.iou, verbose=False)[0]
+                fall_res = None
+                if self.fall_model is not None:
+                    with model_lock(self.fall_model):
+                        fall_res = self.fall_model(frame, conf=self.fall_conf, iou=self.iou, verbose=False)[0]
+
+        # Detections stay as parallel arrays until the kept boxes are turned into payload dicts.
+        ppe = self._collect_dets(ppe_res, "ppe", self.ppe_conf, letterbox)
+        fall = self._collect_dets(fall_res, "fall", self.fall_conf, letterbox)
+        fall_detected = ppe[3] or fall[3]
+        conf = np.concatenate((ppe[1], fall[1])).astype(np.float64).round(4)
+        if not conf.size:
+            return [], fall_detected
+        xyxy = np.concatenate((ppe[0], fall[0]))
+        labels = np.concatenate((ppe[2], fall[2]))
+
+        # Merge overlapping duplicate boxes produced by two-model pipeline.
+        order = self._dedup(xyxy, conf, labels)
+        dets = [
+            {"x1": x1, "y1": y1, "x2": x2, "y2": y2, "label": label, "conf": c}
+            for (x1, y1, x2, y2), c, label in zip(
+                xyxy[order].tolist(), conf[order].tolist(), labels[order].tolist()
+            )
+        ]
+        return dets, fall_detected
+
+    @staticmethod
+    def _dedup(xyxy: np.ndarray, conf: np.ndarray, labels: np.ndarray) -> np.ndarray:
+        """Greedy per-label suppression of overlapping boxes; kept indices, highest conf first."""
+        x1, y1, x2, y2 = xyxy.astype(np.float64).T
+        valid = (x2 > x1) & (y2 > y1)
+        areas = np.maximum(1.0, (x2 - x1) * (y2 - y1))
+
+        keep = np.zeros(len(conf), dtype=bool)
+        for label in set(labels[valid].tolist()):
+            idx = np.flatnonzero(valid & (labels == label))
+            idx = idx[np.argsort(-conf[idx], kind="stable")]
+            while idx.size:
+                i, rest = idx[0], idx[1:]
+                keep[i] = True
+                iw = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+                ih = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+                inter = iw * ih
+                iou = inter / (areas[i] + areas[rest] - inter + 1e-6)
+                idx = rest[iou < DEDUP_IOU]
+
+        order = np.argsort(-conf, kind="stable")
+        return order[keep[order]]
+
+    def _collect_dets(
+        self,
+        result,
+        model_key: str,
+        default_conf: float,
+        letterbox: Letterbox,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, bool]:
+        """Thresholded (xyxy, conf, labels) arrays from one model's result, plus whether a fall was seen."""
+        boxes = None if result is None else result.boxes
+        if boxes is None or len(boxes) == 0:
+            return NO_DETS
+        labels, thresholds, fall_flags = self._class_table(model_key, result.names, default_conf)
+        # One device->host transfer per tensor instead of an .item() sync per box.
+        cls_ids = boxes.cls.cpu().numpy().astype(np.int64)
+        confs = boxes.conf.cpu().numpy()
+        keep = confs >= thresholds[cls_ids]
+        if not keep.any():
+            return NO_DETS
+        cls_ids = cls_ids[keep]
+        xyxy = letterbox.unmap(boxes.xyxy.cpu().numpy()[keep])
+        return xyxy, confs[keep], labels[cls_ids], bool(fall_flags[cls_ids].any())
+
+    def _class_table(
+        self, model_key: str, names: dict[int, str], default_conf: float
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Labels, confidence thresholds and fall flags indexed by class id, built once per model."""
+        table = self._class_tables.get(model_key)
+        if table is None:
+            labels = [str(names[i]) for i in range(max(names) + 1)]
+            table = (
+                np.array(labels, dtype=object),
+                np.array([self._label_threshold(label, default_conf) for label in labels]),
+                np.array([is_fall_label(label, self.fall_class) for label in labels]),
+            )
+            self._class_tables[model_key] = table
+        return table
+
     def _label_threshold(self, label: str, default_conf: float) -> float:
         norm = label.strip().lower().replace("_", "-")
         if "no-hardhat" in norm or "no-vest" in norm:
@@ -320,26 +639,26 @@ class InferenceWorker:
         return COMPLIANT_CONF
 
     def _extract_events(self, dets: list[dict[str, Any]]) -> list[dict[str, Any]]:
-        now = time.time()
-        labels_in_frame = {d["label"] for d in dets}
-
-        # Update streak counters for all seen labels.
-        known_labels = set(self._label_streak.keys()) | labels_in_frame
-        for label in known_labels:
-            if label in labels_in_frame:
-                self._label_streak[label] = self._label_streak.get(label, 0) + 1
-            else:
-                self._label_streak[label] = 0
+        now = time.monotonic()
 
+        # One pass over dets: the keys double as the set of labels present in this frame.
         best_det_per_label: dict[str, dict[str, Any]] = {}
         for det in dets:
             prev = best_det_per_label.get(det["label"])
             if prev is None or det["conf"] > prev["conf"]:
                 best_det_per_label[det["label"]] = det
 
+        # Update streak counters in place: reset labels that left the frame, bump the ones present.
+        streak = self._label_streak
+        for label in streak:
+            if label not in best_det_per_label:
+                streak[label] = 0
+
         events: list[dict[str, Any]] = []
         for label, best_det in best_det_per_label.items():
-            if self._label_streak.get(label, 0) < self.confirm_frames:
+            count = streak.get(label, 0) + 1
+            streak[label] = count
+            if count < self.confirm_frames:
                 continue
             last_logged = self._last_event_at.get(label, 0.0)
             if now - last_logged < self.event_cooldown_sec: